@@ -0,0 +1,47 @@
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from typing import Optional
+from .config import REDIS_URL
+
+CACHE_PREFIX = "spatial"
+# Also bounds a known race: a GET that read a row just before a concurrent PUT/DELETE
+# committed can set() its old body after the writer's delete(), and that stale body
+# is then served until it expires.
+CACHE_EXPIRE_SECONDS = 300
+
+# Serialized GET-by-id responses, shared through Redis so every worker (REST and GraphQL)
+# sees the same entries and invalidations. Without REDIS_URL nothing is cached: a
+# per-process cache would serve stale reads once another worker writes.
+_redis = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+
+def cache_key(kind: str, obj_id: int) -> str:
+    return f"{CACHE_PREFIX}:{kind}:{obj_id}"
+
+async def get(key: str) -> Optional[bytes]:
+    if _redis is None:
+        return None
+    try:
+        return await _redis.get(key)
+    except RedisError:
+        # A cache outage falls back to the database, it never fails the request
+        return None
+
+async def set(key: str, value: bytes):
+    if _redis is None:
+        return
+    try:
+        await _redis.set(key, value, ex=CACHE_EXPIRE_SECONDS)
+    except RedisError:
+        pass
+
+async def delete(key: str):
+    if _redis is None:
+        return
+    try:
+        await _redis.delete(key)
+    except RedisError:
+        pass
+
+async def close():
+    if _redis is not None:
+        await _redis.aclose()
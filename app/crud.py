@@ -1,182 +1,229 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, bindparam, func, cast, literal_column, String, Text, JSON
+from geoalchemy2 import Geography
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
-from shapely.geometry import shape, mapping
-from geoalchemy2.shape import from_shape, to_shape
-from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+import orjson
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from .security import get_password_hash, verify_and_update_password
 from fastapi import HTTPException, status, Depends
-from datetime import datetime, timedelta
-from typing import Optional, List
-import os
-
-# --- Helper to convert tuples to lists for GeoJSON ---
-def tuple_to_list(obj):
-    if isinstance(obj, tuple):
-        return list(obj)
-    if isinstance(obj, list):
-        return [tuple_to_list(i) for i in obj]
-    if isinstance(obj, dict):
-        return {k: tuple_to_list(v) for k, v in obj.items()}
-    return obj
+from typing import List, Union
+import asyncio
 
 # --- Auth helpers ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Built once at import so every login/auth lookup reuses the same statement
+_USER_BY_USERNAME = select(models.User).where(models.User.username == bindparam("username"))
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(_USER_BY_USERNAME, {"username": username})
+    return result.scalar_one_or_none()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
-
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await asyncio.get_running_loop().run_in_executor(None, get_password_hash, user.password)
     db_user = models.User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
     try:
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Username already registered")
     return db_user
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user_by_username(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user_by_username(db, username)
+    if not user:
         return None
+    # Hashing is CPU-bound, keep it off the event loop
+    verified, new_hash = await asyncio.get_running_loop().run_in_executor(None, verify_and_update_password, password, user.hashed_password)
+    if not verified:
+        return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
+# --- Geometry helpers ---
+def geom_from_geojson(geojson: Union[schemas.PointGeom, schemas.PolygonGeom]):
+    # PostGIS parses the GeoJSON from a bound parameter, no Shapely/GEOS round-trip
+    return func.ST_SetSRID(func.ST_GeomFromGeoJSON(geojson.model_dump_json()), 4326)
+
+def geojson_param(geojson: Union[schemas.PointGeom, schemas.PolygonGeom]):
+    return {"geojson": geojson.model_dump_json()}
+
+# Hot statements built once at import; only the bound values change per call
+_GEOM_PARAM = func.ST_SetSRID(func.ST_GeomFromGeoJSON(bindparam("geojson", type_=String)), 4326)
+_POINTS_WITHIN = select(models.SpatialPoint).where(models.SpatialPoint.location.ST_Within(_GEOM_PARAM))
+_POLYGONS_CONTAINING = select(models.SpatialPolygon).where(models.SpatialPolygon.area.ST_Contains(_GEOM_PARAM))
+_POINTS_NEARBY = select(models.SpatialPoint).where(func.ST_DWithin(models.point_location_geography, cast(_GEOM_PARAM, Geography(srid=4326)), bindparam("radius")))
+
+def _json_page(model, geom_column, geom_key):
+    # One page rendered as a JSON array by Postgres: no ORM rows, no per-row Python serialization
+    page = select(model.id, model.name, model.description, geom_column).order_by(model.id).offset(bindparam("skip")).limit(bindparam("limit")).subquery()
+    row = func.json_build_object(
+        'id', page.c.id, 'name', page.c.name, 'description', page.c.description,
+        geom_key, cast(func.ST_AsGeoJSON(page.c[geom_column.key]), JSON),
+    )
+    # Cast to text in SQL: asyncpg's json codec would otherwise json.loads the array
+    # into Python objects before it ever reaches the response
+    return select(cast(func.coalesce(func.json_agg(aggregate_order_by(row, page.c.id)), literal_column("'[]'::json")), Text))
+
+_POINTS_PAGE_JSON = _json_page(models.SpatialPoint, models.SpatialPoint.location, 'location')
+_POLYGONS_PAGE_JSON = _json_page(models.SpatialPolygon, models.SpatialPolygon.area, 'area')
+
 # --- Points CRUD ---
-def create_point(db: Session, point: schemas.PointCreate):
+async def create_point(db: AsyncSession, point: schemas.PointCreate):
+    db_point = models.SpatialPoint(name=point.name, description=point.description, location=geom_from_geojson(point.location))
+    db.add(db_point)
     try:
-        geom = from_shape(shape(point.location), srid=4326)
-    except Exception:
+        await db.commit()
+    except DBAPIError:
+        await db.rollback()
         raise HTTPException(status_code=422, detail="Invalid GeoJSON for Point")
-    db_point = models.SpatialPoint(name=point.name, description=point.description, location=geom)
-    db.add(db_point)
-    db.commit()
-    db.refresh(db_point)
+    await db.refresh(db_point)
     return db_point
 
-def get_point(db: Session, point_id: int):
-    return db.query(models.SpatialPoint).filter(models.SpatialPoint.id == point_id).first()
+# The whole batch goes up as three arrays and is unnested server-side: one fixed
+# statement (cached, three parameters) whatever the batch size, geometries parsed by PostGIS.
+# The serial ids are drawn in ord order, but RETURNING itself has no guaranteed order,
+# so create_points sorts the returned rows by id to hand them back in request order.
+_BULK_POINT_ROWS = func.unnest(
+    bindparam("names", type_=ARRAY(String)),
+    bindparam("descriptions", type_=ARRAY(String)),
+    bindparam("geojsons", type_=ARRAY(String)),
+).table_valued("name", "description", "geojson", with_ordinality="ord").render_derived()
+_POINTS = models.SpatialPoint.__table__
+_INSERT_POINTS = insert(_POINTS).from_select(
+    ["name", "description", "location"],
+    select(_BULK_POINT_ROWS.c.name, _BULK_POINT_ROWS.c.description, func.ST_SetSRID(func.ST_GeomFromGeoJSON(_BULK_POINT_ROWS.c.geojson), 4326))
+    .order_by(_BULK_POINT_ROWS.c.ord),
+).returning(_POINTS.c.id, _POINTS.c.name, _POINTS.c.description, func.ST_AsGeoJSON(_POINTS.c.location).label("location_geojson"))
+
+async def create_points(db: AsyncSession, points: schemas.PointBulkCreate):
+    if not points:
+        return []
+    params = {
+        "names": [p.name for p in points],
+        "descriptions": [p.description for p in points],
+        "geojsons": [p.location.model_dump_json() for p in points],
+    }
+    try:
+        result = await db.execute(_INSERT_POINTS, params)
+        rows = sorted(result.all(), key=lambda row: row.id)
+        await db.commit()
+    except DBAPIError:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail="Invalid GeoJSON for Point")
+    return rows
+
+async def get_point(db: AsyncSession, point_id: int):
+    return await db.get(models.SpatialPoint, point_id)
 
-def get_points(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.SpatialPoint).offset(skip).limit(limit).all()
+async def get_points_json(db: AsyncSession, skip: int = 0, limit: int = 100) -> str:
+    return await db.scalar(_POINTS_PAGE_JSON, {"skip": skip, "limit": limit})
 
-def update_point(db: Session, point_id: int, point: schemas.PointUpdate):
-    db_point = get_point(db, point_id)
+async def update_point(db: AsyncSession, point_id: int, point: schemas.PointUpdate):
+    db_point = await get_point(db, point_id)
     if db_point:
         try:
             db_point.name = point.name
             db_point.description = point.description
-            db_point.location = from_shape(shape(point.location), srid=4326)
-            db.commit()
-            db.refresh(db_point)
+            db_point.location = geom_from_geojson(point.location)
+            await db.commit()
+            await db.refresh(db_point)
         except Exception:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=422, detail="Invalid GeoJSON for Point")
     return db_point
 
-def delete_point(db: Session, point_id: int):
-    db_point = get_point(db, point_id)
+async def delete_point(db: AsyncSession, point_id: int):
+    db_point = await get_point(db, point_id)
     if db_point:
-        db.delete(db_point)
-        db.commit()
+        await db.delete(db_point)
+        await db.commit()
     return db_point
 
 # --- Polygons CRUD ---
-def create_polygon(db: Session, polygon: schemas.PolygonCreate):
+async def create_polygon(db: AsyncSession, polygon: schemas.PolygonCreate):
+    db_polygon = models.SpatialPolygon(name=polygon.name, description=polygon.description, area=geom_from_geojson(polygon.area))
+    db.add(db_polygon)
     try:
-        geom = from_shape(shape(polygon.area), srid=4326)
-    except Exception:
+        await db.commit()
+    except DBAPIError:
+        await db.rollback()
         raise HTTPException(status_code=422, detail="Invalid GeoJSON for Polygon")
-    db_polygon = models.SpatialPolygon(name=polygon.name, description=polygon.description, area=geom)
-    db.add(db_polygon)
-    db.commit()
-    db.refresh(db_polygon)
+    await db.refresh(db_polygon)
     return db_polygon
 
-def get_polygon(db: Session, polygon_id: int):
-    return db.query(models.SpatialPolygon).filter(models.SpatialPolygon.id == polygon_id).first()
+async def get_polygon(db: AsyncSession, polygon_id: int):
+    return await db.get(models.SpatialPolygon, polygon_id)
 
-def get_polygons(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.SpatialPolygon).offset(skip).limit(limit).all()
+async def get_polygons_json(db: AsyncSession, skip: int = 0, limit: int = 100) -> str:
+    return await db.scalar(_POLYGONS_PAGE_JSON, {"skip": skip, "limit": limit})
 
-def update_polygon(db: Session, polygon_id: int, polygon: schemas.PolygonUpdate):
-    db_polygon = get_polygon(db, polygon_id)
+async def update_polygon(db: AsyncSession, polygon_id: int, polygon: schemas.PolygonUpdate):
+    db_polygon = await get_polygon(db, polygon_id)
     if db_polygon:
         try:
             db_polygon.name = polygon.name
             db_polygon.description = polygon.description
-            db_polygon.area = from_shape(shape(polygon.area), srid=4326)
-            db.commit()
-            db.refresh(db_polygon)
+            db_polygon.area = geom_from_geojson(polygon.area)
+            await db.commit()
+            await db.refresh(db_polygon)
         except Exception:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=422, detail="Invalid GeoJSON for Polygon")
     return db_polygon
 
-def delete_polygon(db: Session, polygon_id: int):
-    db_polygon = get_polygon(db, polygon_id)
+async def delete_polygon(db: AsyncSession, polygon_id: int):
+    db_polygon = await get_polygon(db, polygon_id)
     if db_polygon:
-        db.delete(db_polygon)
-        db.commit()
+        await db.delete(db_polygon)
+        await db.commit()
     return db_polygon
 
-def point_to_schema(db_point: models.SpatialPoint):
-    geojson = mapping(to_shape(db_point.location))
-    geojson = tuple_to_list(geojson)
-    return schemas.PointOut(
-        id=db_point.id,
-        name=db_point.name,
-        description=db_point.description,
-        location=geojson
-    )
+# Responses are serialized straight to JSON bytes: rows come from our own tables,
+# so building and re-validating PointOut/PolygonOut for every coordinate is wasted work
+def _point_dict(p):
+    return {"id": p.id, "name": p.name, "description": p.description, "location": orjson.loads(p.location_geojson)}
 
-def polygon_to_schema(db_polygon: models.SpatialPolygon):
-    geojson = mapping(to_shape(db_polygon.area))
-    geojson = tuple_to_list(geojson)
-    return schemas.PolygonOut(
-        id=db_polygon.id,
-        name=db_polygon.name,
-        description=db_polygon.description,
-        area=geojson
-    )
+def _polygon_dict(p):
+    return {"id": p.id, "name": p.name, "description": p.description, "area": orjson.loads(p.area_geojson)}
+
+def point_to_json(db_point: models.SpatialPoint) -> bytes:
+    return orjson.dumps(_point_dict(db_point))
+
+def polygon_to_json(db_polygon: models.SpatialPolygon) -> bytes:
+    return orjson.dumps(_polygon_dict(db_polygon))
+
+def points_to_json(db_points: List[models.SpatialPoint]) -> bytes:
+    return orjson.dumps([_point_dict(p) for p in db_points])
+
+def polygons_to_json(db_polygons: List[models.SpatialPolygon]) -> bytes:
+    return orjson.dumps([_polygon_dict(p) for p in db_polygons])
 
 # --- Spatial Queries ---
-def points_within_polygon(db: Session, polygon_geojson: dict) -> List[models.SpatialPoint]:
+async def points_within_polygon(db: AsyncSession, polygon_geojson: schemas.PolygonGeom) -> List[models.SpatialPoint]:
     try:
-        poly_shape = from_shape(shape(polygon_geojson), srid=4326)
-    except Exception:
+        result = await db.execute(_POINTS_WITHIN, geojson_param(polygon_geojson))
+    except DBAPIError:
+        await db.rollback()
         raise HTTPException(status_code=422, detail="Invalid GeoJSON for Polygon")
-    return db.query(models.SpatialPoint).filter(models.SpatialPoint.location.ST_Within(poly_shape)).all()
+    return result.scalars().all()
 
-def polygons_containing_point(db: Session, point_geojson: dict) -> List[models.SpatialPolygon]:
+async def polygons_containing_point(db: AsyncSession, point_geojson: schemas.PointGeom) -> List[models.SpatialPolygon]:
     try:
-        pt_shape = from_shape(shape(point_geojson), srid=4326)
-    except Exception:
+        result = await db.execute(_POLYGONS_CONTAINING, geojson_param(point_geojson))
+    except DBAPIError:
+        await db.rollback()
         raise HTTPException(status_code=422, detail="Invalid GeoJSON for Point")
-    return db.query(models.SpatialPolygon).filter(models.SpatialPolygon.area.ST_Contains(pt_shape)).all()
+    return result.scalars().all()
 
-def points_nearby(db: Session, point_geojson: dict, radius: float) -> List[models.SpatialPoint]:
+async def points_nearby(db: AsyncSession, point_geojson: schemas.PointGeom, radius: float) -> List[models.SpatialPoint]:
+    # radius in meters, geography cast for accurate distance
     try:
-        pt_shape = from_shape(shape(point_geojson), srid=4326)
-    except Exception:
+        result = await db.execute(_POINTS_NEARBY, {**geojson_param(point_geojson), "radius": radius})
+    except DBAPIError:
+        await db.rollback()
         raise HTTPException(status_code=422, detail="Invalid GeoJSON for Point")
-    # radius in meters, geography cast for accurate distance
-    return db.query(models.SpatialPoint).filter(models.SpatialPoint.location.ST_DWithin(pt_shape, radius)).all() 
\ No newline at end of file
+    return result.scalars().all() 
\ No newline at end of file
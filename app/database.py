@@ -1,8 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from .config import SQLALCHEMY_DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base() 
\ No newline at end of file
+# Sized for bursts of concurrent requests; stale connections are recycled and pinged before use
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, pool_size=20, max_overflow=40, pool_recycle=3600, pool_pre_ping=True)
+# expire_on_commit=False: attributes stay loaded after commit, async sessions can't lazy-load them
+SessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)
+Base = declarative_base()
\ No newline at end of file
@@ -1,18 +1,50 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 from typing import List
-from . import models, schemas, crud
+from . import schemas, crud, security, cache
 from .database import SessionLocal, engine, Base
-from jose import JWTError, jwt
-from datetime import timedelta
-
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Spatial Data Platform API")
+from collections import namedtuple
+from threading import Lock
+from cachetools import TTLCache
+import asyncio
+import orjson
+import time
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await asyncio.get_running_loop().run_in_executor(None, security.warm_up)
+    yield
+    await cache.close()
+    await engine.dispose()
+
+# Request bodies (large polygon coordinate arrays) are parsed with orjson instead of
+# the stdlib json that Starlette's Request.json uses. orjson.JSONDecodeError subclasses
+# json.JSONDecodeError, so malformed bodies still get FastAPI's 422.
+class ORJSONRequest(Request):
+    async def json(self):
+        if not hasattr(self, "_json"):
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+class ORJSONRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await handler(ORJSONRequest(request.scope, request.receive))
+
+        return route_handler
+
+app = FastAPI(title="Spatial Data Platform API", lifespan=lifespan)
+app.router.route_class = ORJSONRoute
 
 # CORS for frontend integration
 app.add_middleware(
@@ -25,32 +57,48 @@ app.add_middleware(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
+# Resolved tokens, so repeat requests skip the JWT verify and the user lookup.
+# Only plain id/username are cached, never ORM instances bound to a session.
+CachedUser = namedtuple("CachedUser", ["id", "username", "exp"])
+_token_cache = TTLCache(maxsize=10_000, ttl=60)
+_token_cache_lock = Lock()
+
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Dependency to get current user
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+    if cached is not None and cached.exp > time.time():
+        return cached
     try:
-        payload = jwt.decode(token, crud.SECRET_KEY, algorithms=[crud.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+        payload = security.decode_access_token(token)
+    except security.InvalidTokenError:
         raise credentials_exception
-    user = crud.get_user_by_username(db, username=username)
+    username: str = payload.get("sub")
+    exp = payload["exp"]
+    if username is None:
+        raise credentials_exception
+    user = await crud.get_user_by_username(db, username=username)
     if user is None:
         raise credentials_exception
-    return user
+    cached = CachedUser(id=user.id, username=user.username, exp=exp)
+    with _token_cache_lock:
+        _token_cache[token] = cached
+    return cached
+
+# Bodies arrive already serialized (by crud or by Postgres); a Response is sent as-is,
+# skipping FastAPI's response_model validation, which stays for the OpenAPI docs
+def json_body(body) -> Response:
+    return Response(body, media_type="application/json")
 
 # --- Exception Handlers ---
 @app.exception_handler(HTTPException)
@@ -62,94 +110,117 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 # --- Auth Endpoints ---
 @app.post("/register", response_model=schemas.UserOut)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.create_user(db, user)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await crud.create_user(db, user)
     return db_user
 
 @app.post("/token", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await crud.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-    access_token = crud.create_access_token(data={"sub": user.username})
+    access_token = security.create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
-# --- Points (Protected) ---
-@app.post("/points/", response_model=schemas.PointOut)
-def create_point(point: schemas.PointCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    db_point = crud.create_point(db, point)
-    return crud.point_to_schema(db_point)
-
-@app.get("/points/", response_model=List[schemas.PointOut])
-def list_points(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    points = crud.get_points(db, skip=skip, limit=limit)
-    return [crud.point_to_schema(p) for p in points]
-
-@app.get("/points/{point_id}", response_model=schemas.PointOut)
-def get_point(point_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    db_point = crud.get_point(db, point_id)
-    if not db_point:
-        raise HTTPException(status_code=404, detail="Point not found")
-    return crud.point_to_schema(db_point)
+# --- Protected routes: auth is checked once at the router level ---
+router = APIRouter(dependencies=[Depends(get_current_user)], route_class=ORJSONRoute)
 
-@app.put("/points/{point_id}", response_model=schemas.PointOut)
-def update_point(point_id: int, point: schemas.PointUpdate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    db_point = crud.update_point(db, point_id, point)
+# --- Points (Protected) ---
+@router.post("/points/", response_model=schemas.PointOut)
+async def create_point(point: schemas.PointCreate, db: AsyncSession = Depends(get_db)):
+    db_point = await crud.create_point(db, point)
+    return json_body(crud.point_to_json(db_point))
+
+@router.post("/points/bulk", response_model=List[schemas.PointOut])
+async def create_points_bulk(points: schemas.PointBulkCreate, db: AsyncSession = Depends(get_db)):
+    rows = await crud.create_points(db, points)
+    return json_body(crud.points_to_json(rows))
+
+@router.get("/points/", response_model=List[schemas.PointOut])
+async def list_points(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    return json_body(await crud.get_points_json(db, skip=skip, limit=limit))
+
+@router.get("/points/{point_id}", response_model=schemas.PointOut)
+async def get_point(point_id: int, db: AsyncSession = Depends(get_db)):
+    # Cached as serialized JSON, dropped on update/delete
+    key = cache.cache_key("point", point_id)
+    body = await cache.get(key)
+    if body is None:
+        db_point = await crud.get_point(db, point_id)
+        if not db_point:
+            raise HTTPException(status_code=404, detail="Point not found")
+        body = crud.point_to_json(db_point)
+        await cache.set(key, body)
+    return json_body(body)
+
+@router.put("/points/{point_id}", response_model=schemas.PointOut)
+async def update_point(point_id: int, point: schemas.PointUpdate, db: AsyncSession = Depends(get_db)):
+    db_point = await crud.update_point(db, point_id, point)
     if not db_point:
         raise HTTPException(status_code=404, detail="Point not found")
-    return crud.point_to_schema(db_point)
+    await cache.delete(cache.cache_key("point", point_id))
+    return json_body(crud.point_to_json(db_point))
 
-@app.delete("/points/{point_id}", response_model=schemas.PointOut)
-def delete_point(point_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    db_point = crud.delete_point(db, point_id)
+@router.delete("/points/{point_id}", response_model=schemas.PointOut)
+async def delete_point(point_id: int, db: AsyncSession = Depends(get_db)):
+    db_point = await crud.delete_point(db, point_id)
     if not db_point:
         raise HTTPException(status_code=404, detail="Point not found")
-    return crud.point_to_schema(db_point)
+    await cache.delete(cache.cache_key("point", point_id))
+    return json_body(crud.point_to_json(db_point))
 
 # --- Polygons (Protected) ---
-@app.post("/polygons/", response_model=schemas.PolygonOut)
-def create_polygon(polygon: schemas.PolygonCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    db_polygon = crud.create_polygon(db, polygon)
-    return crud.polygon_to_schema(db_polygon)
-
-@app.get("/polygons/", response_model=List[schemas.PolygonOut])
-def list_polygons(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    polygons = crud.get_polygons(db, skip=skip, limit=limit)
-    return [crud.polygon_to_schema(p) for p in polygons]
-
-@app.get("/polygons/{polygon_id}", response_model=schemas.PolygonOut)
-def get_polygon(polygon_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    db_polygon = crud.get_polygon(db, polygon_id)
-    if not db_polygon:
-        raise HTTPException(status_code=404, detail="Polygon not found")
-    return crud.polygon_to_schema(db_polygon)
-
-@app.put("/polygons/{polygon_id}", response_model=schemas.PolygonOut)
-def update_polygon(polygon_id: int, polygon: schemas.PolygonUpdate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    db_polygon = crud.update_polygon(db, polygon_id, polygon)
+@router.post("/polygons/", response_model=schemas.PolygonOut)
+async def create_polygon(polygon: schemas.PolygonCreate, db: AsyncSession = Depends(get_db)):
+    db_polygon = await crud.create_polygon(db, polygon)
+    return json_body(crud.polygon_to_json(db_polygon))
+
+@router.get("/polygons/", response_model=List[schemas.PolygonOut])
+async def list_polygons(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    return json_body(await crud.get_polygons_json(db, skip=skip, limit=limit))
+
+@router.get("/polygons/{polygon_id}", response_model=schemas.PolygonOut)
+async def get_polygon(polygon_id: int, db: AsyncSession = Depends(get_db)):
+    key = cache.cache_key("polygon", polygon_id)
+    body = await cache.get(key)
+    if body is None:
+        db_polygon = await crud.get_polygon(db, polygon_id)
+        if not db_polygon:
+            raise HTTPException(status_code=404, detail="Polygon not found")
+        body = crud.polygon_to_json(db_polygon)
+        await cache.set(key, body)
+    return json_body(body)
+
+@router.put("/polygons/{polygon_id}", response_model=schemas.PolygonOut)
+async def update_polygon(polygon_id: int, polygon: schemas.PolygonUpdate, db: AsyncSession = Depends(get_db)):
+    db_polygon = await crud.update_polygon(db, polygon_id, polygon)
     if not db_polygon:
         raise HTTPException(status_code=404, detail="Polygon not found")
-    return crud.polygon_to_schema(db_polygon)
+    await cache.delete(cache.cache_key("polygon", polygon_id))
+    return json_body(crud.polygon_to_json(db_polygon))
 
-@app.delete("/polygons/{polygon_id}", response_model=schemas.PolygonOut)
-def delete_polygon(polygon_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    db_polygon = crud.delete_polygon(db, polygon_id)
+@router.delete("/polygons/{polygon_id}", response_model=schemas.PolygonOut)
+async def delete_polygon(polygon_id: int, db: AsyncSession = Depends(get_db)):
+    db_polygon = await crud.delete_polygon(db, polygon_id)
     if not db_polygon:
         raise HTTPException(status_code=404, detail="Polygon not found")
-    return crud.polygon_to_schema(db_polygon)
+    await cache.delete(cache.cache_key("polygon", polygon_id))
+    return json_body(crud.polygon_to_json(db_polygon))
 
 # --- Spatial Query Endpoints (Protected) ---
-@app.post("/points/within-polygon/", response_model=List[schemas.PointOut])
-def points_within_polygon(query: schemas.PointWithinPolygonQuery, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    points = crud.points_within_polygon(db, query.polygon)
-    return [crud.point_to_schema(p) for p in points]
-
-@app.post("/polygons/containing-point/", response_model=List[schemas.PolygonOut])
-def polygons_containing_point(query: schemas.PolygonContainingPointQuery, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    polygons = crud.polygons_containing_point(db, query.point)
-    return [crud.polygon_to_schema(p) for p in polygons]
-
-@app.post("/points/nearby/", response_model=List[schemas.PointOut])
-def points_nearby(query: schemas.PointsNearbyQuery, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    points = crud.points_nearby(db, query.point, query.radius)
-    return [crud.point_to_schema(p) for p in points] 
\ No newline at end of file
+@router.post("/points/within-polygon/", response_model=List[schemas.PointOut])
+async def points_within_polygon(query: schemas.PointWithinPolygonQuery, db: AsyncSession = Depends(get_db)):
+    points = await crud.points_within_polygon(db, query.polygon)
+    return json_body(crud.points_to_json(points))
+
+@router.post("/polygons/containing-point/", response_model=List[schemas.PolygonOut])
+async def polygons_containing_point(query: schemas.PolygonContainingPointQuery, db: AsyncSession = Depends(get_db)):
+    polygons = await crud.polygons_containing_point(db, query.point)
+    return json_body(crud.polygons_to_json(polygons))
+
+@router.post("/points/nearby/", response_model=List[schemas.PointOut])
+async def points_nearby(query: schemas.PointsNearbyQuery, db: AsyncSession = Depends(get_db)):
+    points = await crud.points_nearby(db, query.point, query.radius)
+    return json_body(crud.points_to_json(points))
+
+app.include_router(router)
\ No newline at end of file
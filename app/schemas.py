@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, conlist
+from typing import Optional, List, Literal
 
 # --- Auth Schemas ---
 class UserCreate(BaseModel):
@@ -9,8 +9,7 @@ class UserCreate(BaseModel):
 class UserOut(BaseModel):
     id: int
     username: str
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Token(BaseModel):
     access_token: str
@@ -19,41 +18,43 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+# --- GeoJSON geometries ---
+# [lon, lat] or [lon, lat, alt]
+Position = conlist(float, min_length=2, max_length=3)
+
+# Typed, so pydantic-core checks type and coordinates while parsing, with no Python callback
+class PointGeom(BaseModel):
+    type: Literal["Point"]
+    coordinates: Position
+
+class PolygonGeom(BaseModel):
+    type: Literal["Polygon"]
+    coordinates: List[List[Position]]
+
 # --- Point & Polygon Schemas ---
 class PointBase(BaseModel):
     name: str
     description: Optional[str] = None
     # GeoJSON Point: {"type": "Point", "coordinates": [lon, lat]}
-    location: Dict[str, Any] = Field(..., example={"type": "Point", "coordinates": [77.0365, 38.8977]})
-
-    @validator('location')
-    def validate_point(cls, v):
-        if v.get('type') != 'Point' or not isinstance(v.get('coordinates'), list):
-            raise ValueError('location must be a GeoJSON Point')
-        return v
+    location: PointGeom = Field(..., examples=[{"type": "Point", "coordinates": [77.0365, 38.8977]}])
 
 class PointCreate(PointBase):
     pass
 
+PointBulkCreate = List[PointCreate]
+
 class PointUpdate(PointBase):
     pass
 
 class PointOut(PointBase):
     id: int
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class PolygonBase(BaseModel):
     name: str
     description: Optional[str] = None
     # GeoJSON Polygon: {"type": "Polygon", "coordinates": [[[lon, lat], ...]]}
-    area: Dict[str, Any] = Field(..., example={"type": "Polygon", "coordinates": [[[77.0, 38.9], [77.1, 38.9], [77.1, 39.0], [77.0, 39.0], [77.0, 38.9]]]})
-
-    @validator('area')
-    def validate_polygon(cls, v):
-        if v.get('type') != 'Polygon' or not isinstance(v.get('coordinates'), list):
-            raise ValueError('area must be a GeoJSON Polygon')
-        return v
+    area: PolygonGeom = Field(..., examples=[{"type": "Polygon", "coordinates": [[[77.0, 38.9], [77.1, 38.9], [77.1, 39.0], [77.0, 39.0], [77.0, 38.9]]]}])
 
 class PolygonCreate(PolygonBase):
     pass
@@ -63,16 +64,15 @@ class PolygonUpdate(PolygonBase):
 
 class PolygonOut(PolygonBase):
     id: int
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # --- Spatial Query Schemas ---
 class PointWithinPolygonQuery(BaseModel):
-    polygon: Dict[str, Any] = Field(..., example={"type": "Polygon", "coordinates": [[[77.0, 38.9], [77.1, 38.9], [77.1, 39.0], [77.0, 39.0], [77.0, 38.9]]]})
+    polygon: PolygonGeom = Field(..., examples=[{"type": "Polygon", "coordinates": [[[77.0, 38.9], [77.1, 38.9], [77.1, 39.0], [77.0, 39.0], [77.0, 38.9]]]}])
 
 class PolygonContainingPointQuery(BaseModel):
-    point: Dict[str, Any] = Field(..., example={"type": "Point", "coordinates": [77.0365, 38.8977]})
+    point: PointGeom = Field(..., examples=[{"type": "Point", "coordinates": [77.0365, 38.8977]}])
 
 class PointsNearbyQuery(BaseModel):
-    point: Dict[str, Any] = Field(..., example={"type": "Point", "coordinates": [77.0365, 38.8977]})
+    point: PointGeom = Field(..., examples=[{"type": "Point", "coordinates": [77.0365, 38.8977]}])
     radius: float = Field(..., description="Radius in meters") 
\ No newline at end of file
@@ -0,0 +1,107 @@
+from passlib.context import CryptContext
+from datetime import timedelta
+from typing import Optional
+from threading import Lock
+from cachetools import LRUCache
+import base64
+import hashlib
+import hmac
+import os
+import orjson
+import time
+
+# Password hashing and token helpers shared by the REST and GraphQL apps, so a
+# process serving both sets up one CryptContext and one verification cache.
+
+# argon2 is the active scheme; bcrypt hashes still verify and are re-hashed
+# with argon2 on the next successful login.
+# TESTING drops argon2 to its minimum cost so the suite isn't dominated by hashing;
+# never set it in a deployment.
+TESTING = bool(os.getenv("TESTING"))
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated=["bcrypt"],
+    argon2__time_cost=1 if TESTING else 2,
+    argon2__memory_cost=1024 if TESTING else 19456,
+    argon2__parallelism=1,
+)
+SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 60
+ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+# HMAC digests of (hash, password) pairs that already verified, so repeat logins
+# skip the argon2 work. Keyed with SECRET_KEY; plaintext passwords are never stored.
+_verified_cache = LRUCache(maxsize=2048)
+_verified_cache_lock = Lock()
+
+def _verified_cache_key(plain_password, hashed_password):
+    msg = hashed_password.encode() + b"\0" + plain_password.encode()
+    return hmac.new(SECRET_KEY.encode(), msg, hashlib.sha256).digest()
+
+def verify_and_update_password(plain_password, hashed_password):
+    key = _verified_cache_key(plain_password, hashed_password)
+    with _verified_cache_lock:
+        if key in _verified_cache:
+            return True, None
+    verified, new_hash = pwd_context.verify_and_update(plain_password, hashed_password)
+    # Hashes that still need upgrading are replaced on this login, no point caching them
+    if verified and new_hash is None:
+        with _verified_cache_lock:
+            _verified_cache[key] = True
+    return verified, new_hash
+
+def verify_password(plain_password, hashed_password):
+    return verify_and_update_password(plain_password, hashed_password)[0]
+
+class InvalidTokenError(ValueError):
+    pass
+
+def _b64url(raw: bytes) -> bytes:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=")
+
+def _b64url_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+# HS256 tokens are signed and verified locally: the header never changes, so it is
+# encoded once, and each token copies a keyed HMAC instead of re-deriving the key.
+_JWT_HEADER = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+_JWT_SIGNER = hmac.new(SECRET_KEY.encode(), digestmod=hashlib.sha256)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    expires_in = int(expires_delta.total_seconds()) if expires_delta else ACCESS_TOKEN_EXPIRE_SECONDS
+    to_encode.update({"exp": int(time.time()) + expires_in})
+    signing_input = _JWT_HEADER + b"." + _b64url(orjson.dumps(to_encode))
+    signer = _JWT_SIGNER.copy()
+    signer.update(signing_input)
+    return (signing_input + b"." + _b64url(signer.digest())).decode()
+
+def decode_access_token(token: str) -> dict:
+    # Only tokens we issue are accepted, so the header must match ours byte for byte;
+    # that also rules out alg=none and algorithm-confusion tricks
+    signing_input, _, signature = token.encode().rpartition(b".")
+    header, _, payload = signing_input.partition(b".")
+    if header != _JWT_HEADER:
+        raise InvalidTokenError("unexpected token header")
+    signer = _JWT_SIGNER.copy()
+    signer.update(signing_input)
+    # Compared in encoded form: decoding first would accept variants of the last
+    # character that differ only in its unused padding bits
+    if not hmac.compare_digest(_b64url(signer.digest()), signature):
+        raise InvalidTokenError("bad signature")
+    try:
+        claims = orjson.loads(_b64url_decode(payload))
+    except ValueError as exc:
+        raise InvalidTokenError("malformed token") from exc
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    if not isinstance(exp, int) or exp <= time.time():
+        raise InvalidTokenError("token expired")
+    return claims
+
+def warm_up():
+    # Loads the argon2 backend and runs one hash so the first /register or login isn't slower
+    pwd_context.hash("warm-up")
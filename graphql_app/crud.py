@@ -1,183 +1,189 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, bindparam, func, cast, String
+from geoalchemy2 import Geography
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models
-from shapely.geometry import shape, mapping
-from geoalchemy2.shape import from_shape, to_shape
-from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
-from typing import Optional, List
-import os
-
-# --- Helper to convert tuples to lists for GeoJSON ---
-def tuple_to_list(obj):
-    if isinstance(obj, tuple):
-        return list(obj)
-    if isinstance(obj, list):
-        return [tuple_to_list(i) for i in obj]
-    if isinstance(obj, dict):
-        return {k: tuple_to_list(v) for k, v in obj.items()}
-    return obj
+import orjson
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from app.security import get_password_hash, verify_and_update_password
+from typing import List
+import asyncio
 
 # --- Auth helpers ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Built once at import so every login/auth lookup reuses the same statement
+_USER_BY_USERNAME = select(models.User).where(models.User.username == bindparam("username"))
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(_USER_BY_USERNAME, {"username": username})
+    return result.scalar_one_or_none()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
-
-def create_user(db: Session, username: str, password: str):
-    hashed_password = get_password_hash(password)
+async def create_user(db: AsyncSession, username: str, password: str):
+    hashed_password = await asyncio.get_running_loop().run_in_executor(None, get_password_hash, password)
     db_user = models.User(username=username, hashed_password=hashed_password)
     db.add(db_user)
     try:
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         return None
     return db_user
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user_by_username(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user_by_username(db, username)
+    if not user:
+        return None
+    # Hashing is CPU-bound, keep it off the event loop
+    verified, new_hash = await asyncio.get_running_loop().run_in_executor(None, verify_and_update_password, password, user.hashed_password)
+    if not verified:
         return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
+# --- Geometry helpers ---
+def geom_from_geojson(geojson: dict):
+    # PostGIS parses the GeoJSON from a bound parameter, no Shapely/GEOS round-trip
+    return func.ST_SetSRID(func.ST_GeomFromGeoJSON(orjson.dumps(geojson).decode()), 4326)
+
+def geojson_param(geojson: dict):
+    return {"geojson": orjson.dumps(geojson).decode()}
+
+# Hot statements built once at import; only the bound values change per call
+_GEOM_PARAM = func.ST_SetSRID(func.ST_GeomFromGeoJSON(bindparam("geojson", type_=String)), 4326)
+_POINTS_WITHIN = select(models.SpatialPoint).where(models.SpatialPoint.location.ST_Within(_GEOM_PARAM))
+_POLYGONS_CONTAINING = select(models.SpatialPolygon).where(models.SpatialPolygon.area.ST_Contains(_GEOM_PARAM))
+_ALL_POINTS = select(models.SpatialPoint)
+_ALL_POLYGONS = select(models.SpatialPolygon)
+_POINTS_NEARBY = select(models.SpatialPoint).where(func.ST_DWithin(models.point_location_geography, cast(_GEOM_PARAM, Geography(srid=4326)), bindparam("radius")))
+
 # --- Points CRUD ---
-def create_point(db: Session, name: str, description: str, location: dict):
+async def create_point(db: AsyncSession, name: str, description: str, location: dict):
+    db_point = models.SpatialPoint(name=name, description=description, location=geom_from_geojson(location))
+    db.add(db_point)
     try:
-        geom = from_shape(shape(location), srid=4326)
-    except Exception:
+        await db.commit()
+    except DBAPIError:
+        await db.rollback()
         return None
-    db_point = models.SpatialPoint(name=name, description=description, location=geom)
-    db.add(db_point)
-    db.commit()
-    db.refresh(db_point)
+    await db.refresh(db_point)
     return db_point
 
-def get_point(db: Session, point_id: int):
-    return db.query(models.SpatialPoint).filter(models.SpatialPoint.id == point_id).first()
+async def get_point(db: AsyncSession, point_id: int):
+    return await db.get(models.SpatialPoint, point_id)
 
-def get_points(db: Session):
-    return db.query(models.SpatialPoint).all()
+async def get_points(db: AsyncSession):
+    result = await db.execute(_ALL_POINTS)
+    return result.scalars().all()
 
-def update_point(db: Session, point_id: int, name: str, description: str, location: dict):
-    db_point = get_point(db, point_id)
+async def update_point(db: AsyncSession, point_id: int, name: str, description: str, location: dict):
+    db_point = await get_point(db, point_id)
     if db_point:
         try:
             db_point.name = name
             db_point.description = description
-            db_point.location = from_shape(shape(location), srid=4326)
-            db.commit()
-            db.refresh(db_point)
+            db_point.location = geom_from_geojson(location)
+            await db.commit()
+            await db.refresh(db_point)
         except Exception:
-            db.rollback()
+            await db.rollback()
             return None
     return db_point
 
-def delete_point(db: Session, point_id: int):
-    db_point = get_point(db, point_id)
+async def delete_point(db: AsyncSession, point_id: int):
+    db_point = await get_point(db, point_id)
     if db_point:
-        db.delete(db_point)
-        db.commit()
+        await db.delete(db_point)
+        await db.commit()
         return True
     return False
 
 # --- Polygons CRUD ---
-def create_polygon(db: Session, name: str, description: str, area: dict):
+async def create_polygon(db: AsyncSession, name: str, description: str, area: dict):
+    db_polygon = models.SpatialPolygon(name=name, description=description, area=geom_from_geojson(area))
+    db.add(db_polygon)
     try:
-        geom = from_shape(shape(area), srid=4326)
-    except Exception:
+        await db.commit()
+    except DBAPIError:
+        await db.rollback()
         return None
-    db_polygon = models.SpatialPolygon(name=name, description=description, area=geom)
-    db.add(db_polygon)
-    db.commit()
-    db.refresh(db_polygon)
+    await db.refresh(db_polygon)
     return db_polygon
 
-def get_polygon(db: Session, polygon_id: int):
-    return db.query(models.SpatialPolygon).filter(models.SpatialPolygon.id == polygon_id).first()
+async def get_polygon(db: AsyncSession, polygon_id: int):
+    return await db.get(models.SpatialPolygon, polygon_id)
 
-def get_polygons(db: Session):
-    return db.query(models.SpatialPolygon).all()
+async def get_polygons(db: AsyncSession):
+    result = await db.execute(_ALL_POLYGONS)
+    return result.scalars().all()
 
-def update_polygon(db: Session, polygon_id: int, name: str, description: str, area: dict):
-    db_polygon = get_polygon(db, polygon_id)
+async def update_polygon(db: AsyncSession, polygon_id: int, name: str, description: str, area: dict):
+    db_polygon = await get_polygon(db, polygon_id)
     if db_polygon:
         try:
             db_polygon.name = name
             db_polygon.description = description
-            db_polygon.area = from_shape(shape(area), srid=4326)
-            db.commit()
-            db.refresh(db_polygon)
+            db_polygon.area = geom_from_geojson(area)
+            await db.commit()
+            await db.refresh(db_polygon)
         except Exception:
-            db.rollback()
+            await db.rollback()
             return None
     return db_polygon
 
-def delete_polygon(db: Session, polygon_id: int):
-    db_polygon = get_polygon(db, polygon_id)
+async def delete_polygon(db: AsyncSession, polygon_id: int):
+    db_polygon = await get_polygon(db, polygon_id)
     if db_polygon:
-        db.delete(db_polygon)
-        db.commit()
+        await db.delete(db_polygon)
+        await db.commit()
         return True
     return False
 
 # --- Spatial Queries ---
-def points_within_polygon(db: Session, polygon_geojson: dict):
+async def points_within_polygon(db: AsyncSession, polygon_geojson: dict):
     try:
-        poly_shape = from_shape(shape(polygon_geojson), srid=4326)
-    except Exception:
+        result = await db.execute(_POINTS_WITHIN, geojson_param(polygon_geojson))
+    except DBAPIError:
+        await db.rollback()
         return []
-    return db.query(models.SpatialPoint).filter(models.SpatialPoint.location.ST_Within(poly_shape)).all()
+    return result.scalars().all()
 
-def polygons_containing_point(db: Session, point_geojson: dict):
+async def polygons_containing_point(db: AsyncSession, point_geojson: dict):
     try:
-        pt_shape = from_shape(shape(point_geojson), srid=4326)
-    except Exception:
+        result = await db.execute(_POLYGONS_CONTAINING, geojson_param(point_geojson))
+    except DBAPIError:
+        await db.rollback()
         return []
-    return db.query(models.SpatialPolygon).filter(models.SpatialPolygon.area.ST_Contains(pt_shape)).all()
+    return result.scalars().all()
 
-def points_nearby(db: Session, point_geojson: dict, radius: float):
+async def points_nearby(db: AsyncSession, point_geojson: dict, radius: float):
+    # radius in meters, geography cast for accurate distance
     try:
-        pt_shape = from_shape(shape(point_geojson), srid=4326)
-    except Exception:
+        result = await db.execute(_POINTS_NEARBY, {**geojson_param(point_geojson), "radius": radius})
+    except DBAPIError:
+        await db.rollback()
         return []
-    return db.query(models.SpatialPoint).filter(models.SpatialPoint.location.ST_DWithin(pt_shape, radius)).all()
+    return result.scalars().all()
 
 # --- Serialization helpers ---
 def point_to_dict(point):
-    geojson = mapping(to_shape(point.location))
-    geojson = tuple_to_list(geojson)
     return {
         "id": point.id,
         "name": point.name,
         "description": point.description,
-        "location": geojson
+        "location": orjson.loads(point.location_geojson)
     }
 
 def polygon_to_dict(polygon):
-    geojson = mapping(to_shape(polygon.area))
-    geojson = tuple_to_list(geojson)
     return {
         "id": polygon.id,
         "name": polygon.name,
         "description": polygon.description,
-        "area": geojson
-    } 
\ No newline at end of file
+        "area": orjson.loads(polygon.area_geojson)
+    }
+
+def points_to_dicts(points):
+    return [point_to_dict(p) for p in points]
+
+def polygons_to_dicts(polygons):
+    return [polygon_to_dict(p) for p in polygons] 
\ No newline at end of file
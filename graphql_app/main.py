@@ -1,9 +1,40 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+import orjson
+from typing import Union
 from strawberry.fastapi import GraphQLRouter
+from .database import SessionLocal, engine
 from .schema import schema
+from app import security, cache
+import asyncio
 
-app = FastAPI(title="Spatial Data Platform GraphQL API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.get_running_loop().run_in_executor(None, security.warm_up)
+    yield
+    await cache.close()
+    await engine.dispose()
 
-graphql_app = GraphQLRouter(schema)
+app = FastAPI(title="Spatial Data Platform GraphQL API", lifespan=lifespan)
 
-app.include_router(graphql_app, prefix="/graphql") 
\ No newline at end of file
+# Dependency to get DB session
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+# One session per HTTP request, shared by every resolver in the operation;
+# concurrent query resolvers take db_lock before touching it
+async def get_context(db: AsyncSession = Depends(get_db)):
+    return {"db": db, "db_lock": asyncio.Lock()}
+
+class ORJSONGraphQLRouter(GraphQLRouter):
+    def encode_json(self, data: object) -> bytes:
+        return orjson.dumps(data)
+
+    def decode_json(self, data: Union[str, bytes]) -> object:
+        return orjson.loads(data)
+
+graphql_app = ORJSONGraphQLRouter(schema, context_getter=get_context)
+
+app.include_router(graphql_app, prefix="/graphql")
\ No newline at end of file
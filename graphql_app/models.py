@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Index
-from geoalchemy2 import Geometry
+from sqlalchemy import Column, Integer, String, Index, func, cast
+from sqlalchemy.orm import column_property, deferred
+from geoalchemy2 import Geometry, Geography
 from .database import Base
 
 class User(Base):
@@ -13,17 +14,28 @@ class SpatialPoint(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     description = Column(String)
-    location = Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
+    location = deferred(Column(Geometry(geometry_type='POINT', srid=4326, spatial_index=False), nullable=False))
+    # GeoJSON rendered by PostGIS; the WKB column is only loaded on access
+    location_geojson = column_property(func.ST_AsGeoJSON(location.expression))
+    # The one GiST index on the column; spatial_index=False stops GeoAlchemy adding a same-named duplicate
     __table_args__ = (
         Index('idx_points_location', 'location', postgresql_using='gist'),
     )
 
+# location as geography, so ST_DWithin takes its radius in metres; the expression
+# index lets the planner use GiST for it
+point_location_geography = cast(SpatialPoint.__table__.c.location, Geography(geometry_type='POINT', srid=4326))
+Index('idx_points_location_geography', point_location_geography, postgresql_using='gist')
+
 class SpatialPolygon(Base):
     __tablename__ = 'polygons'
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     description = Column(String)
-    area = Column(Geometry(geometry_type='POLYGON', srid=4326), nullable=False)
+    area = deferred(Column(Geometry(geometry_type='POLYGON', srid=4326, spatial_index=False), nullable=False))
+    # GeoJSON rendered by PostGIS; the WKB column is only loaded on access
+    area_geojson = column_property(func.ST_AsGeoJSON(area.expression))
+    # The one GiST index on the column; spatial_index=False stops GeoAlchemy adding a same-named duplicate
     __table_args__ = (
         Index('idx_polygons_area', 'area', postgresql_using='gist'),
     ) 
\ No newline at end of file
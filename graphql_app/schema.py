@@ -1,9 +1,12 @@
 import strawberry
 from typing import List, Optional, Any
 from strawberry.types import Info
-from . import crud, models, database
-from sqlalchemy.orm import Session
-import json
+from . import crud, models
+from app import security, cache
+from threading import Lock
+from cachetools import TTLCache
+import orjson
+import time
 import typing as t
 
 # --- Custom JSON Scalar ---
@@ -11,10 +14,10 @@ import typing as t
 class JSON:
     @staticmethod
     def serialize(value: t.Any) -> str:
-        return json.dumps(value)
+        return orjson.dumps(value).decode()
     @staticmethod
     def parse_value(value: str) -> t.Any:
-        return json.loads(value)
+        return orjson.loads(value)
 
 # --- Strawberry Types ---
 @strawberry.type
@@ -42,130 +45,153 @@ class Token:
     token_type: str
 
 # --- Auth Helper ---
-def get_db() -> Session:
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# token -> (exp, User), so repeat requests skip the JWT verify and the user lookup
+_token_cache = TTLCache(maxsize=10_000, ttl=60)
+_token_cache_lock = Lock()
 
-def get_current_user(info: Info) -> Optional[User]:
+async def get_current_user(info: Info) -> Optional[User]:
     request = info.context["request"]
     auth = request.headers.get("authorization")
     if not auth or not auth.startswith("Bearer "):
         return None
     token = auth.split(" ", 1)[1]
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+    if cached is not None and cached[0] > time.time():
+        return cached[1]
     try:
-        from jose import jwt
-        payload = jwt.decode(token, crud.SECRET_KEY, algorithms=[crud.ALGORITHM])
+        payload = security.decode_access_token(token)
         username = payload.get("sub")
+        exp = payload["exp"]
         if not username:
             return None
-        db = next(get_db())
-        user = crud.get_user_by_username(db, username)
+        async with info.context["db_lock"]:
+            user = await crud.get_user_by_username(info.context["db"], username)
         if user:
-            return User(id=user.id, username=user.username)
+            current_user = User(id=user.id, username=user.username)
+            with _token_cache_lock:
+                _token_cache[token] = (exp, current_user)
+            return current_user
     except Exception:
         return None
     return None
 
 # --- Queries ---
+# graphql-core resolves sibling query fields concurrently, but they all share the request's
+# AsyncSession, which cannot run two statements at once; db_lock serialises its use.
 @strawberry.type
 class Query:
     @strawberry.field
-    def points(self, info: Info) -> List[Point]:
-        db = next(get_db())
-        return [Point(**crud.point_to_dict(p)) for p in crud.get_points(db)]
+    async def points(self, info: Info) -> List[Point]:
+        async with info.context["db_lock"]:
+            points = await crud.get_points(info.context["db"])
+        return [Point(**d) for d in crud.points_to_dicts(points)]
 
     @strawberry.field
-    def polygons(self, info: Info) -> List[Polygon]:
-        db = next(get_db())
-        return [Polygon(**crud.polygon_to_dict(p)) for p in crud.get_polygons(db)]
+    async def polygons(self, info: Info) -> List[Polygon]:
+        async with info.context["db_lock"]:
+            polygons = await crud.get_polygons(info.context["db"])
+        return [Polygon(**d) for d in crud.polygons_to_dicts(polygons)]
 
     @strawberry.field
-    def point(self, info: Info, id: int) -> Optional[Point]:
-        db = next(get_db())
-        p = crud.get_point(db, id)
+    async def point(self, info: Info, id: int) -> Optional[Point]:
+        async with info.context["db_lock"]:
+            p = await crud.get_point(info.context["db"], id)
         return Point(**crud.point_to_dict(p)) if p else None
 
     @strawberry.field
-    def polygon(self, info: Info, id: int) -> Optional[Polygon]:
-        db = next(get_db())
-        p = crud.get_polygon(db, id)
+    async def polygon(self, info: Info, id: int) -> Optional[Polygon]:
+        async with info.context["db_lock"]:
+            p = await crud.get_polygon(info.context["db"], id)
         return Polygon(**crud.polygon_to_dict(p)) if p else None
 
     @strawberry.field
-    def points_within_polygon(self, info: Info, polygon: str) -> List[Point]:
-        db = next(get_db())
-        poly_geojson = json.loads(polygon)
-        return [Point(**crud.point_to_dict(p)) for p in crud.points_within_polygon(db, poly_geojson)]
+    async def points_within_polygon(self, info: Info, polygon: str) -> List[Point]:
+        poly_geojson = orjson.loads(polygon)
+        async with info.context["db_lock"]:
+            points = await crud.points_within_polygon(info.context["db"], poly_geojson)
+        return [Point(**d) for d in crud.points_to_dicts(points)]
 
     @strawberry.field
-    def polygons_containing_point(self, info: Info, point: str) -> List[Polygon]:
-        db = next(get_db())
-        pt_geojson = json.loads(point)
-        return [Polygon(**crud.polygon_to_dict(p)) for p in crud.polygons_containing_point(db, pt_geojson)]
+    async def polygons_containing_point(self, info: Info, point: str) -> List[Polygon]:
+        pt_geojson = orjson.loads(point)
+        async with info.context["db_lock"]:
+            polygons = await crud.polygons_containing_point(info.context["db"], pt_geojson)
+        return [Polygon(**d) for d in crud.polygons_to_dicts(polygons)]
 
     @strawberry.field
-    def points_nearby(self, info: Info, point: str, radius: float) -> List[Point]:
-        db = next(get_db())
-        pt_geojson = json.loads(point)
-        return [Point(**crud.point_to_dict(p)) for p in crud.points_nearby(db, pt_geojson, radius)]
+    async def points_nearby(self, info: Info, point: str, radius: float) -> List[Point]:
+        pt_geojson = orjson.loads(point)
+        async with info.context["db_lock"]:
+            points = await crud.points_nearby(info.context["db"], pt_geojson, radius)
+        return [Point(**d) for d in crud.points_to_dicts(points)]
 
 # --- Mutations ---
+# Top-level mutation fields are executed one after another, so they use the session directly.
+# Updates and deletes drop the REST API's cached GET-by-id entry for the same row.
 @strawberry.type
 class Mutation:
     @strawberry.mutation
-    def register(self, info: Info, username: str, password: str) -> bool:
-        db = next(get_db())
-        user = crud.create_user(db, username, password)
+    async def register(self, info: Info, username: str, password: str) -> bool:
+        db = info.context["db"]
+        user = await crud.create_user(db, username, password)
         return user is not None
 
     @strawberry.mutation
-    def login(self, info: Info, username: str, password: str) -> Optional[Token]:
-        db = next(get_db())
-        user = crud.authenticate_user(db, username, password)
+    async def login(self, info: Info, username: str, password: str) -> Optional[Token]:
+        db = info.context["db"]
+        user = await crud.authenticate_user(db, username, password)
         if not user:
             return None
-        access_token = crud.create_access_token({"sub": user.username})
+        access_token = security.create_access_token({"sub": user.username})
         return Token(access_token=access_token, token_type="bearer")
 
     @strawberry.mutation
-    def create_point(self, info: Info, name: str, description: str, location: str) -> Optional[Point]:
-        db = next(get_db())
-        loc_geojson = json.loads(location)
-        p = crud.create_point(db, name, description, loc_geojson)
+    async def create_point(self, info: Info, name: str, description: str, location: str) -> Optional[Point]:
+        db = info.context["db"]
+        loc_geojson = orjson.loads(location)
+        p = await crud.create_point(db, name, description, loc_geojson)
         return Point(**crud.point_to_dict(p)) if p else None
 
     @strawberry.mutation
-    def update_point(self, info: Info, id: int, name: str, description: str, location: str) -> Optional[Point]:
-        db = next(get_db())
-        loc_geojson = json.loads(location)
-        p = crud.update_point(db, id, name, description, loc_geojson)
+    async def update_point(self, info: Info, id: int, name: str, description: str, location: str) -> Optional[Point]:
+        db = info.context["db"]
+        loc_geojson = orjson.loads(location)
+        p = await crud.update_point(db, id, name, description, loc_geojson)
+        if p:
+            await cache.delete(cache.cache_key("point", id))
         return Point(**crud.point_to_dict(p)) if p else None
 
     @strawberry.mutation
-    def delete_point(self, info: Info, id: int) -> bool:
-        db = next(get_db())
-        return crud.delete_point(db, id)
+    async def delete_point(self, info: Info, id: int) -> bool:
+        db = info.context["db"]
+        deleted = await crud.delete_point(db, id)
+        if deleted:
+            await cache.delete(cache.cache_key("point", id))
+        return deleted
 
     @strawberry.mutation
-    def create_polygon(self, info: Info, name: str, description: str, area: str) -> Optional[Polygon]:
-        db = next(get_db())
-        area_geojson = json.loads(area)
-        p = crud.create_polygon(db, name, description, area_geojson)
+    async def create_polygon(self, info: Info, name: str, description: str, area: str) -> Optional[Polygon]:
+        db = info.context["db"]
+        area_geojson = orjson.loads(area)
+        p = await crud.create_polygon(db, name, description, area_geojson)
         return Polygon(**crud.polygon_to_dict(p)) if p else None
 
     @strawberry.mutation
-    def update_polygon(self, info: Info, id: int, name: str, description: str, area: str) -> Optional[Polygon]:
-        db = next(get_db())
-        area_geojson = json.loads(area)
-        p = crud.update_polygon(db, id, name, description, area_geojson)
+    async def update_polygon(self, info: Info, id: int, name: str, description: str, area: str) -> Optional[Polygon]:
+        db = info.context["db"]
+        area_geojson = orjson.loads(area)
+        p = await crud.update_polygon(db, id, name, description, area_geojson)
+        if p:
+            await cache.delete(cache.cache_key("polygon", id))
         return Polygon(**crud.polygon_to_dict(p)) if p else None
 
     @strawberry.mutation
-    def delete_polygon(self, info: Info, id: int) -> bool:
-        db = next(get_db())
-        return crud.delete_polygon(db, id)
+    async def delete_polygon(self, info: Info, id: int) -> bool:
+        db = info.context["db"]
+        deleted = await crud.delete_polygon(db, id)
+        if deleted:
+            await cache.delete(cache.cache_key("polygon", id))
+        return deleted
 
 schema = strawberry.Schema(query=Query, mutation=Mutation) 
\ No newline at end of file
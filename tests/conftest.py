@@ -0,0 +1,4 @@
+import os
+
+# Cheap password hashing for the suite; conftest is loaded before any test module imports the app
+os.environ.setdefault("TESTING", "1")
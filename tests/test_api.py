@@ -1,14 +1,25 @@
+import orjson
 import pytest
 from fastapi.testclient import TestClient
-from app.main import app
+from sqlalchemy.ext.asyncio import AsyncSession
 
-client = TestClient(app)
+from app.main import app, get_db
+from app import cache
+from app.database import engine
+from graphql_app.main import app as gql_app
 
 USERNAME = "apitestuser"
 PASSWORD = "apitestpass"
 
-@pytest.fixture(scope="module")
-def auth_headers():
+@pytest.fixture(scope="session")
+def client():
+    # Entering the client runs the lifespan (table creation) and keeps a single
+    # event loop for the session, which the asyncpg pool is bound to
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
     # Register
     client.post("/register", json={"username": USERNAME, "password": PASSWORD})
     # Login
@@ -17,12 +28,36 @@ def auth_headers():
     token = r.json()["access_token"]
     return {"Authorization": f"Bearer {token}"}
 
-def test_auth_required():
+@pytest.fixture(autouse=True)
+def rollback_db(client):
+    # Each test runs inside one outer transaction that is rolled back afterwards;
+    # the app's commits only release SAVEPOINTs, so nothing is flushed to disk
+    async def begin():
+        conn = await engine.connect()
+        trans = await conn.begin()
+        session = AsyncSession(bind=conn, autoflush=False, expire_on_commit=False, join_transaction_mode="create_savepoint")
+        return conn, trans, session
+
+    async def end():
+        await session.close()
+        await trans.rollback()
+        await conn.close()
+
+    async def override_get_db():
+        yield session
+
+    conn, trans, session = client.portal.call(begin)
+    app.dependency_overrides[get_db] = override_get_db
+    yield
+    app.dependency_overrides.pop(get_db, None)
+    client.portal.call(end)
+
+def test_auth_required(client):
     # Should fail without token
     r = client.get("/points/")
     assert r.status_code == 401
 
-def test_point_crud(auth_headers):
+def test_point_crud(client, auth_headers):
     # Create point
     point = {
         "name": "API Test Point",
@@ -57,7 +92,22 @@ def test_point_crud(auth_headers):
     r = client.get(f"/points/{point_id}", headers=auth_headers)
     assert r.status_code == 404
 
-def test_polygon_crud(auth_headers):
+def test_points_bulk(client, auth_headers):
+    points = [
+        {"name": f"Bulk Point {i}", "description": "Bulk insert", "location": {"type": "Point", "coordinates": [77.0 + i / 100, 38.9]}}
+        for i in range(3)
+    ]
+    r = client.post("/points/bulk", json=points, headers=auth_headers)
+    assert r.status_code == 200
+    created = r.json()
+    assert [p["name"] for p in created] == [p["name"] for p in points]
+    assert created[1]["location"]["coordinates"] == [77.01, 38.9]
+
+    for p in created:
+        r = client.delete(f"/points/{p['id']}", headers=auth_headers)
+        assert r.status_code == 200
+
+def test_polygon_crud(client, auth_headers):
     # Create polygon
     polygon = {
         "name": "API Test Polygon",
@@ -92,7 +142,7 @@ def test_polygon_crud(auth_headers):
     r = client.get(f"/polygons/{polygon_id}", headers=auth_headers)
     assert r.status_code == 404
 
-def test_spatial_queries(auth_headers):
+def test_spatial_queries(client, auth_headers):
     # Create a polygon and a point inside it
     polygon = {
         "name": "Spatial Query Polygon",
@@ -124,8 +174,117 @@ def test_spatial_queries(auth_headers):
     assert r.status_code == 200
     assert any(p["id"] == polygon_id for p in r.json())
 
-    # Points nearby (within 10000 meters)
+    # Points nearby (within 10000 meters): ~5 km north is in, 1 degree (~111 km) north is out
+    near_far = {}
+    for label, lat in (("near", 38.995), ("far", 39.95)):
+        r = client.post("/points/", json={"name": f"Nearby {label}", "location": {"type": "Point", "coordinates": [77.05, lat]}}, headers=auth_headers)
+        assert r.status_code == 200
+        near_far[label] = r.json()["id"]
+
     query = {"point": point["location"], "radius": 10000}
     r = client.post("/points/nearby/", json=query, headers=auth_headers)
     assert r.status_code == 200
-    assert any(p["id"] == point_id for p in r.json()) 
\ No newline at end of file
+    nearby_ids = {p["id"] for p in r.json()}
+    assert point_id in nearby_ids
+    assert near_far["near"] in nearby_ids
+    assert near_far["far"] not in nearby_ids
+
+def test_graphql_sibling_root_fields():
+    # Sibling root fields resolve concurrently but share one session per request
+    with TestClient(gql_app) as gql:
+        r = gql.post("/graphql", json={"query": "{ points { id } polygons { id } }"})
+    assert r.status_code == 200
+    body = r.json()
+    assert "errors" not in body
+    assert isinstance(body["data"]["points"], list)
+    assert isinstance(body["data"]["polygons"], list)
+
+class FakeRedis:
+    # In-memory stand-in for the redis.asyncio client used by app.cache
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+    async def aclose(self):
+        pass
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(cache, "_redis", fake)
+    return fake
+
+def test_point_cache(client, auth_headers, fake_redis):
+    point = {"name": "Cached Point", "location": {"type": "Point", "coordinates": [77.0, 38.9]}}
+    r = client.post("/points/", json=point, headers=auth_headers)
+    point_id = r.json()["id"]
+    key = cache.cache_key("point", point_id)
+
+    # GET fills the cache, PUT drops it, the next GET refills it with the new row
+    r = client.get(f"/points/{point_id}", headers=auth_headers)
+    assert r.status_code == 200
+    assert orjson.loads(fake_redis.store[key])["name"] == "Cached Point"
+    r = client.put(f"/points/{point_id}", json={**point, "name": "Recached Point"}, headers=auth_headers)
+    assert r.status_code == 200
+    assert key not in fake_redis.store
+    r = client.get(f"/points/{point_id}", headers=auth_headers)
+    assert r.json()["name"] == "Recached Point"
+    assert orjson.loads(fake_redis.store[key])["name"] == "Recached Point"
+
+    # DELETE drops it too
+    r = client.delete(f"/points/{point_id}", headers=auth_headers)
+    assert r.status_code == 200
+    assert key not in fake_redis.store
+
+def test_polygon_cache(client, auth_headers, fake_redis):
+    polygon = {"name": "Cached Polygon", "area": {"type": "Polygon", "coordinates": [[[77.0, 38.9], [77.1, 38.9], [77.1, 39.0], [77.0, 38.9]]]}}
+    r = client.post("/polygons/", json=polygon, headers=auth_headers)
+    polygon_id = r.json()["id"]
+    key = cache.cache_key("polygon", polygon_id)
+
+    client.get(f"/polygons/{polygon_id}", headers=auth_headers)
+    assert key in fake_redis.store
+    r = client.put(f"/polygons/{polygon_id}", json={**polygon, "name": "Recached Polygon"}, headers=auth_headers)
+    assert r.status_code == 200
+    assert key not in fake_redis.store
+    client.get(f"/polygons/{polygon_id}", headers=auth_headers)
+    assert key in fake_redis.store
+    r = client.delete(f"/polygons/{polygon_id}", headers=auth_headers)
+    assert r.status_code == 200
+    assert key not in fake_redis.store
+
+def test_graphql_mutations_invalidate_cache(fake_redis):
+    # The GraphQL app has its own session, so this test commits and cleans up after itself
+    location = orjson.dumps({"type": "Point", "coordinates": [77.0, 38.9]}).decode()
+    with TestClient(gql_app) as gql:
+        def run(query, **variables):
+            r = gql.post("/graphql", json={"query": query, "variables": variables})
+            assert r.status_code == 200
+            body = r.json()
+            assert "errors" not in body
+            return body["data"]
+
+        point_id = run(
+            "mutation($loc: String!) { createPoint(name: \"GQL Cached\", description: \"\", location: $loc) { id } }",
+            loc=location,
+        )["createPoint"]["id"]
+        key = cache.cache_key("point", point_id)
+
+        fake_redis.store[key] = b"stale"
+        run(
+            "mutation($id: Int!, $loc: String!) { updatePoint(id: $id, name: \"GQL Updated\", description: \"\", location: $loc) { id } }",
+            id=point_id, loc=location,
+        )
+        assert key not in fake_redis.store
+
+        fake_redis.store[key] = b"stale"
+        assert run("mutation($id: Int!) { deletePoint(id: $id) }", id=point_id)["deletePoint"] is True
+        assert key not in fake_redis.store